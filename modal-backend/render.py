@@ -1,269 +1,1007 @@
 import modal
+import collections
+import fcntl
+import functools
+import json
+import mmap
+import multiprocessing
+import queue
+import re
+import shutil
 import subprocess
 import tempfile
+import threading
+import urllib.request
 import os
-import json
-from pathlib import Path
 
 app = modal.App("opentrace-render")
 
-# Docker image with FFmpeg, Pillow, and FastAPI installed
+# Numba's compiled kernels are cached on a volume shared by the render
+# containers, so a cold start loads them instead of recompiling
+cache = modal.Volume.from_name("opentrace-cache", create_if_missing=True)
+CACHE_DIR = "/cache"
+
+# Docker image with FFmpeg, NumPy, OpenCV, Numba, and FastAPI (with
+# multipart form support) installed
 image = (
     modal.Image.debian_slim()
     .apt_install("ffmpeg")
-    .pip_install("Pillow", "fastapi")
+    .pip_install("numpy", "opencv-python-headless", "numba", "fastapi", "python-multipart")
+    .env({"NUMBA_CACHE_DIR": f"{CACHE_DIR}/numba"})
 )
 
+# Finished renders (and the inputs/fragments of split jobs) are kept on a
+# volume and downloaded from there instead of being inlined as base64
+renders = modal.Volume.from_name("opentrace-renders", create_if_missing=True)
+RENDERS_DIR = "/renders"
+
+# How long renders stay on the volume before cleanup_renders deletes them
+RENDER_RETENTION_SECONDS = 24 * 60 * 60
+
+# Read size when copying an uploaded video or downloading one from video_url
+INPUT_CHUNK_BYTES = 1 << 20
+
+# Seconds a video_url connection or read may stall before the download is
+# abandoned, so a slow host can't hold a render container until its timeout
+VIDEO_URL_TIMEOUT = 30
+
+# Characters of inline base64 input read at a time; each is decoded up to
+# its last whole 4-character group, with the rest carried to the next
+BASE64_CHUNK_CHARS = 4 * 65536
+
+# Tracer coordinates are passed to OpenCV as fixed-point integers with this
+# many fractional bits, so anti-aliased lines keep sub-pixel positioning.
+SUBPIXEL_SHIFT = 4
+SUBPIXEL_SCALE = 1 << SUBPIXEL_SHIFT
+
+# Peak opacity of the blurred glow around the tracer line
+GLOW_ALPHA = 80
+
+# CPU cores requested for the render container; overlay frames are
+# generated on a pool of this many worker processes
+RENDER_CPUS = 8
+
+# GPU attached to render containers so FFmpeg can encode with NVENC;
+# libx264 is used instead whenever NVENC isn't usable
+RENDER_GPU = "T4"
+
+# Consecutive overlay frames rendered per pool task
+OVERLAY_CHUNK_FRAMES = 8
+
+# Rendered chunks buffered between the pool and the thread feeding FFmpeg
+OVERLAY_QUEUE_CHUNKS = 2
+
+# Packets FFmpeg buffers per input before its demuxer blocks; overlay
+# packets are whole raw frames, so this is kept well short of the default
+# cap a long burst from the pool could otherwise grow to
+FFMPEG_THREAD_QUEUE_SIZE = 64
+
+# Size requested for the pipe feeding FFmpeg (the unprivileged Linux
+# maximum); the 64 KiB default splits every frame into hundreds of writes
+FFMPEG_PIPE_BYTES = 1 << 20
+
+# Tracer style used when a request doesn't set one, and the base any
+# partial style is merged onto
+DEFAULT_STYLE = {
+    "startColor": "#FFD700",
+    "endColor": "#FF4500",
+    "lineWidth": 4,
+    "glowIntensity": 10,
+}
+
+# Videos longer than two segments are split into segments of this many
+# seconds, rendered in parallel containers and stitched back together
+SEGMENT_SECONDS = 10
+
+with image.imports():
+    import cv2
+    import numpy as np
+    from fastapi import Request
+
 
 @app.function(
     image=image,
     timeout=900,  # 15 minute timeout for longer videos
     memory=32768,  # 32GB RAM
-    cpu=8,  # More CPU cores for faster processing
+    cpu=RENDER_CPUS,  # More CPU cores for faster processing
+    gpu=RENDER_GPU,  # NVENC for the final encode
+    volumes={RENDERS_DIR: renders, CACHE_DIR: cache},
 )
 @modal.fastapi_endpoint(method="POST")
-def render_video(data: dict):
+async def render_video(request: "Request"):
     """
     Render a video with tracer overlay.
 
     OPTIMIZED VERSION: Pipes frames directly to FFmpeg to avoid disk I/O.
+    Long videos are split into segments that render in parallel containers.
+    The video is uploaded as the binary `video` part of a multipart form,
+    with the render parameters as JSON in its `params` field. A plain JSON
+    body with the parameters and a `video_url` (or inline `video_base64`)
+    is accepted too. The result is stored on the renders volume and
+    returned as a download URL rather than inlined in the response.
     """
+    from fastapi.concurrency import run_in_threadpool
+
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        data = json.loads(form["params"])
+        video_file = form["video"].file
+    else:
+        data = await request.json()
+        video_file = None
+
+    # Rendering blocks, so it runs off the event loop
+    return await run_in_threadpool(_render_request, data, video_file)
+
+
+def _render_request(data: dict, video_file=None):
+    """Run a render request; video_file is the uploaded video, if any."""
     import base64
-    from PIL import Image, ImageDraw
-    import io
     import time
+    import uuid
 
     total_start = time.time()
     print(f"[RENDER] Starting render job (optimized pipeline)")
 
-    video_base64 = data["video_base64"]
     points = data["points"]
     output_fps = data.get("fps", 60)
     source_fps = data.get("source_fps", 30)
     width = data["width"]
     height = data["height"]
     duration = data["duration"]
-    style = data.get("style", {
-        "startColor": "#FFD700",
-        "endColor": "#FF4500",
-        "lineWidth": 4,
-        "glowIntensity": 10
-    })
+    # Checked here so a bad style is reported to the client instead of
+    # failing inside the overlay workers
+    try:
+        style = _validate_style(data.get("style", {}))
+    except ValueError as e:
+        return {"error": str(e)}
+    if video_file is None and "video_url" in data:
+        try:
+            _check_video_url(data["video_url"])
+        except ValueError as e:
+            return {"error": str(e)}
 
     print(f"[RENDER] Video: {width}x{height}, {duration:.2f}s, source_fps={source_fps}, output_fps={output_fps}")
     print(f"[RENDER] Points: {len(points)} tracer points")
-    print(f"[RENDER] Input size: {len(video_base64) / 1024 / 1024:.2f} MB (base64)")
 
-    fps_scale = output_fps / source_fps
     total_frames = int(duration * output_fps)
-    line_width = style.get("lineWidth", 4)
-    glow_intensity = style.get("glowIntensity", 10)
-
-    # Adaptive supersampling
-    total_pixels = width * height
-    is_high_res = total_pixels >= 1920 * 1080
-    is_4k = total_pixels >= 3840 * 2160
-
-    if is_4k or total_frames > 600:
-        scale = 1
-    elif is_high_res or total_frames > 300:
-        scale = 2
-    else:
-        scale = 2
 
-    print(f"[RENDER] Resolution: {width}x{height}, scale={scale}x, total_frames={total_frames}")
+    print(f"[RENDER] Resolution: {width}x{height}, total_frames={total_frames}")
+
+    job = {
+        "points": points,
+        "style": style,
+        "width": width,
+        "height": height,
+        "duration": duration,
+        "source_fps": source_fps,
+        "output_fps": output_fps,
+        # Chosen once here so every segment of a split job is encoded the
+        # same way and the fragments can be stitched without re-encoding
+        "encoder": _detect_video_encoder(),
+    }
+    print(f"[RENDER] Encoder: {job['encoder']}")
+
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(RENDERS_DIR, job_id)
+    os.makedirs(job_dir)
 
     with tempfile.TemporaryDirectory() as tmpdir:
         # Write input video
         step_start = time.time()
         input_path = os.path.join(tmpdir, "input.mp4")
-        video_bytes = base64.b64decode(video_base64)
-        with open(input_path, "wb") as f:
-            f.write(video_bytes)
-        print(f"[RENDER] Input video ready: {len(video_bytes) / 1024 / 1024:.2f} MB in {time.time() - step_start:.2f}s")
+        if video_file is not None:
+            with open(input_path, "wb") as f:
+                shutil.copyfileobj(video_file, f, INPUT_CHUNK_BYTES)
+        elif "video_url" in data:
+            # Redirects are checked like the URL itself
+            opener = urllib.request.build_opener(_VideoURLRedirectHandler)
+            try:
+                with opener.open(data["video_url"], timeout=VIDEO_URL_TIMEOUT) as response, \
+                        open(input_path, "wb") as f:
+                    shutil.copyfileobj(response, f, INPUT_CHUNK_BYTES)
+            except (OSError, ValueError) as e:
+                # HTTP errors, refused connections, TLS failures and
+                # timeouts are all OSErrors
+                return {"error": f"Could not download video_url: {e}"}
+        else:
+            # Decode in chunks so the full decoded video is never held in
+            # memory alongside the base64 string, then drop the string.
+            # Characters outside the alphabet (line breaks in wrapped input)
+            # are dropped, as b64decode would, before splitting into groups
+            video_base64 = data.pop("video_base64")
+            carry = ""
+            with open(input_path, "wb") as f:
+                for i in range(0, len(video_base64), BASE64_CHUNK_CHARS):
+                    chunk = carry + re.sub(r"[^A-Za-z0-9+/=]", "", video_base64[i:i + BASE64_CHUNK_CHARS])
+                    whole = len(chunk) - len(chunk) % 4
+                    f.write(base64.b64decode(chunk[:whole]))
+                    carry = chunk[whole:]
+                if carry:
+                    f.write(base64.b64decode(carry))
+            del video_base64
+        input_size_mb = os.path.getsize(input_path) / 1024 / 1024
+        print(f"[RENDER] Input video ready: {input_size_mb:.2f} MB in {time.time() - step_start:.2f}s")
 
         output_path = os.path.join(tmpdir, "output.mp4")
 
-        # Start FFmpeg process with pipe input for overlay frames
-        # This avoids writing thousands of PNG files to disk
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-y",
-            # Input 1: Original video
-            "-i", input_path,
-            # Input 2: Raw RGBA frames piped from stdin
+        if duration > 2 * SEGMENT_SECONDS:
+            # Split and stitch: each segment renders in its own container,
+            # reading the input from and writing its fragment to the volume
+            bounds = [
+                (start, min(start + SEGMENT_SECONDS, duration))
+                for start in range(0, int(np.ceil(duration)), SEGMENT_SECONDS)
+                if start < duration
+            ]
+            print(f"[RENDER] Rendering {len(bounds)} segments of {SEGMENT_SECONDS}s in parallel...")
+            segment_start = time.time()
+
+            shutil.copyfile(input_path, os.path.join(job_dir, "input.mp4"))
+            renders.commit()
+            try:
+                fragment_paths = list(render_segment.starmap(
+                    (job_id, i, job, start, end) for i, (start, end) in enumerate(bounds)
+                ))
+            except RuntimeError as e:
+                print(f"[RENDER] Segment render FAILED")
+                return {"error": str(e)}
+            renders.reload()
+            print(f"[RENDER] Segments rendered in {time.time() - segment_start:.2f}s")
+
+            error = _concat_segments(fragment_paths, input_path, output_path)
+            for path in fragment_paths + [os.path.join(job_dir, "input.mp4")]:
+                os.remove(path)
+        else:
+            error = _render_overlay_video(input_path, output_path, job)
+
+        if error is not None:
+            return {"error": error}
+
+        # Store the output on the volume for download
+        shutil.copyfile(output_path, os.path.join(job_dir, "output.mp4"))
+        renders.commit()
+
+        output_size_mb = os.path.getsize(output_path) / 1024 / 1024
+        total_elapsed = time.time() - total_start
+        print(f"[RENDER] Output: {output_size_mb:.2f} MB, total time: {total_elapsed:.2f}s")
+
+        return {
+            "success": True,
+            "video_url": f"{download_video.get_web_url()}?job_id={job_id}"
+        }
+
+
+def _validate_style(style: dict) -> dict:
+    """Fill in a tracer style from DEFAULT_STYLE, raising ValueError if it is invalid."""
+    if not isinstance(style, dict):
+        raise ValueError("Invalid style: expected an object")
+    style = {**DEFAULT_STYLE, **style}
+    for key in ("startColor", "endColor"):
+        if not isinstance(style[key], str) or not re.fullmatch(r"#?[0-9a-fA-F]{6}", style[key]):
+            raise ValueError(f"Invalid style: {key} must be a hex color like #FFD700")
+    for key in ("lineWidth", "glowIntensity"):
+        value = style[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1000:
+            raise ValueError(f"Invalid style: {key} must be a number from 0 to 1000")
+    return style
+
+
+def _check_video_url(url: str):
+    """Raise ValueError unless url is an http(s) URL whose host resolves only to public addresses."""
+    import ipaddress
+    import socket
+    import urllib.parse
+
+    parsed = urllib.parse.urlsplit(url if isinstance(url, str) else "")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("video_url must be an http or https URL")
+    try:
+        addresses = socket.getaddrinfo(parsed.hostname, parsed.port, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError):
+        raise ValueError(f"video_url host could not be resolved: {parsed.hostname}") from None
+    for *_, sockaddr in addresses:
+        if not ipaddress.ip_address(sockaddr[0]).is_global:
+            raise ValueError("video_url must point to a public address")
+
+
+class _VideoURLRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows a video_url redirect only if its target passes _check_video_url."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_video_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+@app.function(
+    image=image,
+    timeout=900,
+    memory=32768,
+    cpu=RENDER_CPUS,
+    gpu=RENDER_GPU,
+    volumes={RENDERS_DIR: renders, CACHE_DIR: cache},
+)
+def render_segment(job_id: str, index: int, job: dict, start_time: float, end_time: float) -> str:
+    """
+    Render one time segment of a split-and-stitch job.
+
+    Reads the job's input from the renders volume and writes the encoded
+    fragment next to it (video only; audio is taken from the original
+    input when the fragments are stitched together). Returns the
+    fragment's path on the volume.
+    """
+    # A warm container may still have the volume as it was before this
+    # job's input was committed
+    renders.reload()
+    job_dir = os.path.join(RENDERS_DIR, job_id)
+    output_path = os.path.join(job_dir, f"segment{index:04d}.mp4")
+    error = _render_overlay_video(
+        os.path.join(job_dir, "input.mp4"), output_path, job, start_time, end_time
+    )
+    if error is not None:
+        raise RuntimeError(error)
+
+    renders.commit()
+    return output_path
+
+
+@app.function(image=image, volumes={RENDERS_DIR: renders})
+@modal.fastapi_endpoint(method="GET")
+def download_video(job_id: str):
+    """Serve a finished render from the renders volume."""
+    from fastapi import HTTPException
+    from fastapi.responses import FileResponse
+
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+        raise HTTPException(status_code=404, detail="Render not found")
+
+    renders.reload()
+    output_path = os.path.join(RENDERS_DIR, job_id, "output.mp4")
+    if not os.path.exists(output_path):
+        raise HTTPException(status_code=404, detail="Render not found")
+
+    return FileResponse(output_path, media_type="video/mp4", filename="traced-shot.mp4")
+
+
+@app.function(image=image, volumes={RENDERS_DIR: renders}, schedule=modal.Period(hours=1))
+def cleanup_renders():
+    """Delete renders older than RENDER_RETENTION_SECONDS from the volume."""
+    import time
+
+    cutoff = time.time() - RENDER_RETENTION_SECONDS
+    for entry in os.scandir(RENDERS_DIR):
+        if entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path)
+    renders.commit()
+
+
+def _render_overlay_video(
+    input_path: str,
+    output_path: str,
+    job: dict,
+    start_time: float = 0.0,
+    end_time: float = None,
+):
+    """
+    Overlay the tracer onto the input video and encode the result.
+
+    When end_time is given only that window of the video is rendered, as
+    a video-only fragment for split-and-stitch. Returns FFmpeg's error
+    output if encoding failed, otherwise None.
+    """
+    import time
+
+    points = job["points"]
+    width = job["width"]
+    height = job["height"]
+    source_fps = job["source_fps"]
+    output_fps = job["output_fps"]
+    is_segment = end_time is not None
+    if end_time is None:
+        end_time = job["duration"]
+
+    # Only the tracer's own timeline is rendered: one overlay frame per
+    # source frame, up to the last tracer point. FFmpeg's overlay filter
+    # holds each frame until the next one and repeats the final tracer
+    # to the end of the video, so the output frame rate costs nothing.
+    frame_indices = np.sort(np.fromiter((p["frameIndex"] for p in points), np.float64, len(points)))
+    first_frame = int(np.floor(start_time * source_fps))
+    stop_frame = max(first_frame + 1, int(np.ceil(end_time * source_fps)))
+    if len(points):
+        stop_frame = max(first_frame + 1, min(int(np.ceil(frame_indices[-1])) + 1, stop_frame))
+    overlay_frames = stop_frame - first_frame
+    visible_counts = np.searchsorted(frame_indices, np.arange(first_frame, stop_frame), side="right")
+    frames_with_content = int(np.count_nonzero(visible_counts >= 2))
+
+    # Leading frames without a tracer are never generated or piped, and the
+    # overlay filter is only enabled from the first frame with a tracer, so
+    # the video frames before it pass through without being blended
+    empty_prefix = 0
+    if frames_with_content:
+        empty_prefix = int(np.argmax(visible_counts >= 2))
+    pipe_start = first_frame + empty_prefix
+    overlay_offset = pipe_start / source_fps - start_time
+    total_frames = int(round((end_time - start_time) * output_fps))
+
+    # Start FFmpeg process with pipe input for overlay frames
+    # This avoids writing thousands of PNG files to disk
+    ffmpeg_cmd = ["ffmpeg", "-y"]
+    if is_segment:
+        ffmpeg_cmd += ["-ss", f"{start_time:.6f}", "-t", f"{end_time - start_time:.6f}"]
+    ffmpeg_cmd += [
+        # Input 1: Original video
+        "-thread_queue_size", str(FFMPEG_THREAD_QUEUE_SIZE),
+        "-i", input_path,
+    ]
+    if frames_with_content:
+        ffmpeg_cmd += [
+            # Input 2: Raw RGBA frames piped from stdin, starting at the first
+            # source frame with a tracer
             "-f", "rawvideo",
             "-pix_fmt", "rgba",
             "-s", f"{width}x{height}",
-            "-r", str(output_fps),
+            "-r", str(source_fps),
+            "-thread_queue_size", str(FFMPEG_THREAD_QUEUE_SIZE),
             "-i", "pipe:0",
-            # Filter: overlay with alpha blending
-            "-filter_complex", "[0:v][1:v]overlay=0:0:format=auto[out]",
+            # Filter: shift the tracer frames to their place on the timeline and
+            # overlay with alpha blending, from half a source frame before the
+            # first tracer frame so rounding can't drop it
+            "-filter_complex",
+            f"[1:v]setpts=PTS+{overlay_offset:.6f}/TB[tracer];"
+            "[0:v][tracer]overlay=0:0:format=auto:alpha=premultiplied"
+            f":enable='gte(t,{overlay_offset - 0.5 / source_fps:.6f})'[out]",
             "-map", "[out]",
+        ]
+    else:
+        # No tracer in this window, so there is nothing to overlay and the
+        # video is just re-encoded
+        ffmpeg_cmd += ["-map", "0:v"]
+    ffmpeg_cmd += _video_encoder_args(job["encoder"])
+    ffmpeg_cmd += [
+        "-pix_fmt", "yuv420p",
+        "-r", str(output_fps),
+    ]
+    if is_segment:
+        # Fragments are remuxed when stitched, so faststart would only add
+        # a second pass over each one here
+        ffmpeg_cmd += ["-an", "-frames:v", str(total_frames)]
+    else:
+        ffmpeg_cmd += [
             "-map", "0:a:0?",
-            # Output encoding - optimized for speed
-            "-c:v", "libx264",
-            "-preset", "ultrafast",  # Fastest encoding
-            "-crf", "20",  # Slightly lower quality for speed (was 18)
-            "-tune", "fastdecode",  # Optimize for fast playback
             "-c:a", "aac",
             "-b:a", "128k",  # Lower audio bitrate
-            "-pix_fmt", "yuv420p",
             "-movflags", "+faststart",
-            "-threads", "0",  # Use all CPU cores
-            "-r", str(output_fps),
-            output_path
         ]
+    ffmpeg_cmd.append(output_path)
 
-        print(f"[RENDER] Starting FFmpeg pipeline...")
-        ffmpeg_start = time.time()
+    print(f"[RENDER] Starting FFmpeg pipeline...")
+    ffmpeg_start = time.time()
 
+    if not frames_with_content:
+        result = subprocess.run(ffmpeg_cmd, capture_output=True)
+        if result.returncode != 0:
+            print(f"[RENDER] FFmpeg FAILED")
+            print(f"[RENDER] FFmpeg stderr: {result.stderr.decode()}")
+            return result.stderr.decode()
+        print(f"[RENDER] No tracer frames; video re-encoded in {time.time() - ffmpeg_start:.2f}s")
+        return None
+
+    # Generate frames on a worker pool in contiguous chunks and pipe them
+    # to FFmpeg strictly in order, with a bounded number of chunks in
+    # flight so memory stays flat however long the video is. Workers render
+    # straight into slots of a ring buffer shared with this process, and
+    # FFmpeg is fed views of those slots, so frames are never pickled or
+    # copied into bytes on the way. Pipe writes happen on their own thread,
+    # so collecting results from the pool carries on while FFmpeg drains
+    # the pipe; the writer hands each slot back once it has been written.
+    frame_gen_start = time.time()
+    last_progress_log = 0
+    frames_written = empty_prefix
+
+    # One worker per core the container can actually run on, and never
+    # more than there are chunks, since each worker holds its own set of
+    # full-frame masks
+    chunk_count = -(-(stop_frame - pipe_start) // OVERLAY_CHUNK_FRAMES)
+    workers = max(1, min(RENDER_CPUS, len(os.sched_getaffinity(0)), chunk_count))
+    max_in_flight = 2 * workers
+    print(f"[RENDER] Rendering overlay on {workers} worker processes")
+
+    # Ring slots cover every chunk rendered or waiting to be written at
+    # once: the in-flight pool tasks, the queue, the one being written and
+    # the one the main thread is handing over (about 1.3 GB at 1080p with
+    # 8 workers)
+    ring_chunks = max_in_flight + OVERLAY_QUEUE_CHUNKS + 2
+    frame_shape = (OVERLAY_CHUNK_FRAMES, height, width, 4)
+    ring_buffer = mmap.mmap(-1, ring_chunks * int(np.prod(frame_shape)))
+    ring = np.frombuffer(ring_buffer, np.uint8).reshape(ring_chunks, *frame_shape)
+    free_slots = queue.Queue()
+    for slot in range(ring_chunks):
+        free_slots.put(slot)
+    write_queue = queue.Queue(maxsize=OVERLAY_QUEUE_CHUNKS)
+
+    def write_chunk(slot, sources):
+        nonlocal frames_written, last_progress_log
+        # Frames unchanged from the one before them point back at its slot
+        write_queue.put((slot, [ring[slot, i].data for i in sources]))
+        frames_written += len(sources)
+
+        # Log progress every 10%
+        progress_pct = int((frames_written / overlay_frames) * 100)
+        if progress_pct >= last_progress_log + 10:
+            elapsed = time.time() - frame_gen_start
+            fps_rate = frames_written / elapsed if elapsed > 0 else 0
+            remaining = (overlay_frames - frames_written) / fps_rate if fps_rate > 0 else 0
+            print(f"[RENDER] Progress: {progress_pct}% ({frames_written}/{overlay_frames}) - {fps_rate:.1f} fps, ~{remaining:.1f}s remaining")
+            last_progress_log = progress_pct
+
+    # The workers are forked before FFmpeg and this function's threads are
+    # started, so they don't inherit FFmpeg's pipes, and after the kernel
+    # is loaded, so they don't each compile it. The process is still
+    # multithreaded when they fork: the endpoint runs renders on an anyio
+    # worker thread while the event loop thread lives on, alongside the
+    # Modal runtime's threads (and Python 3.13 warns about forking it).
+    # That is safe because a worker only runs the pool's task loop, cv2
+    # (with its thread pool off), NumPy and the compiled kernel; it never
+    # prints, logs, imports or touches the event loop, so it can't block on
+    # a lock another thread held at fork time.
+    _composite_kernel()
+    pool = multiprocessing.get_context("fork").Pool(
+        workers,
+        initializer=_init_overlay_worker,
+        initargs=(ring, points, job["style"], width, height),
+    )
+    with pool:
         proc = subprocess.Popen(
             ffmpeg_cmd,
             stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
             stderr=subprocess.PIPE
         )
+        try:
+            fcntl.fcntl(proc.stdin, fcntl.F_SETPIPE_SZ, FFMPEG_PIPE_BYTES)
+        except OSError:
+            pass  # Keep the default size if the request exceeds the system limit
+
+        # FFmpeg logs progress to stderr for the whole encode; read it as it
+        # comes so a full stderr pipe can never stall FFmpeg, and with it the
+        # frames being written to stdin
+        stderr_chunks = []
+        stderr_reader = threading.Thread(target=_drain_pipe, args=(proc.stderr, stderr_chunks))
+        stderr_reader.start()
+        writer = threading.Thread(target=_pipe_writer, args=(write_queue, proc.stdin, free_slots))
+        writer.start()
+
+        try:
+            pending = collections.deque()
+            for start in range(pipe_start, stop_frame, OVERLAY_CHUNK_FRAMES):
+                stop = min(start + OVERLAY_CHUNK_FRAMES, stop_frame)
+                slot = free_slots.get()
+                pending.append((slot, pool.apply_async(_render_overlay_chunk, (start, stop, slot))))
+                if len(pending) >= max_in_flight:
+                    slot, result = pending.popleft()
+                    write_chunk(slot, result.get())
+            while pending:
+                slot, result = pending.popleft()
+                write_chunk(slot, result.get())
+        except BaseException:
+            # Rendering failed: stop FFmpeg, which also unblocks the writer
+            proc.kill()
+            raise
+        finally:
+            write_queue.put(None)
+            writer.join()
+
+            # Close stdin and wait for FFmpeg to finish
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass  # FFmpeg already exited; its exit code says why
+            proc.wait()
+            stderr_reader.join()
+    stderr = b"".join(stderr_chunks)
+
+    frame_gen_elapsed = time.time() - frame_gen_start
+    ffmpeg_elapsed = time.time() - ffmpeg_start
+
+    if proc.returncode != 0:
+        print(f"[RENDER] FFmpeg FAILED")
+        print(f"[RENDER] FFmpeg stderr: {stderr.decode()}")
+        return stderr.decode()
+
+    print(f"[RENDER] Frame generation: {overlay_frames} overlay frames for {total_frames} output frames in {frame_gen_elapsed:.2f}s ({overlay_frames/frame_gen_elapsed:.1f} fps)")
+    print(f"[RENDER] Frames with tracer: {frames_with_content}/{overlay_frames} ({empty_prefix} empty leading frames skipped)")
+    print(f"[RENDER] FFmpeg total time: {ffmpeg_elapsed:.2f}s")
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _detect_video_encoder() -> str:
+    """Use NVENC if this container's FFmpeg can open it on a GPU, else libx264."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=black:s=256x256",
+            "-frames:v", "1",
+            "-c:v", "h264_nvenc",
+            "-f", "null", "-",
+        ],
+        capture_output=True,
+    )
+    return "h264_nvenc" if result.returncode == 0 else "libx264"
+
+
+def _video_encoder_args(encoder: str) -> list:
+    """FFmpeg output options for encoding the composited video."""
+    if encoder == "h264_nvenc":
+        return [
+            "-c:v", "h264_nvenc",
+            "-preset", "p4",
+            "-tune", "hq",
+            "-rc", "vbr",
+            "-cq", "20",  # Same quality target as the libx264 CRF
+            "-b:v", "0",
+        ]
+    return [
+        # Output encoding - optimized for speed
+        "-c:v", "libx264",
+        "-preset", "ultrafast",  # Fastest encoding
+        "-crf", "20",  # Slightly lower quality for speed (was 18)
+        # Slice-based threading keeps every core busy on each frame, and no
+        # lookahead/B-frames means frames are encoded as soon as they arrive
+        "-x264-params", "sliced-threads=1:rc-lookahead=0:ref=1:bframes=0",
+        # One slice thread per allocated core; auto-detection would count
+        # the host's cores rather than the container's
+        "-threads", str(RENDER_CPUS),
+    ]
+
+
+def _drain_pipe(pipe, chunks: list):
+    """Read a pipe to EOF, collecting what was read into chunks."""
+    for chunk in iter(lambda: pipe.read1(65536), b""):
+        chunks.append(chunk)
+    pipe.close()
+
+
+def _pipe_writer(write_queue, pipe, free_slots):
+    """
+    Write queued chunks of frames to FFmpeg's stdin until None is queued.
 
-        # Generate and pipe frames directly to FFmpeg
-        frame_gen_start = time.time()
-        last_progress_log = 0
-        frames_with_content = 0
-
-        # Pre-create empty frame bytes for reuse
-        empty_frame = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-        empty_frame_bytes = empty_frame.tobytes()
-
-        for frame_idx in range(total_frames):
-            # Log progress every 10%
-            progress_pct = int((frame_idx / total_frames) * 100)
-            if progress_pct >= last_progress_log + 10:
-                elapsed = time.time() - frame_gen_start
-                fps_rate = frame_idx / elapsed if elapsed > 0 else 0
-                remaining = (total_frames - frame_idx) / fps_rate if fps_rate > 0 else 0
-                print(f"[RENDER] Progress: {progress_pct}% ({frame_idx}/{total_frames}) - {fps_rate:.1f} fps, ~{remaining:.1f}s remaining")
-                last_progress_log = progress_pct
-
-            source_frame_idx = frame_idx / fps_scale
-            visible_points = [p for p in points if p["frameIndex"] <= source_frame_idx]
-
-            # For frames without tracer, send pre-computed empty frame
-            if len(visible_points) < 2:
-                proc.stdin.write(empty_frame_bytes)
-                continue
-
-            frames_with_content += 1
-
-            # Create frame with tracer
-            if scale > 1:
-                img = Image.new("RGBA", (width * scale, height * scale), (0, 0, 0, 0))
-            else:
-                img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(img)
-
-            # Draw glow - reduced to 2 layers for speed
-            if glow_intensity > 0:
-                for layer in range(2, 0, -1):  # 2 glow layers instead of 3
-                    alpha = int(50 / layer)
-                    glow_width = line_width + glow_intensity * layer * 0.6
-
-                    for i in range(1, len(visible_points)):
-                        p1 = visible_points[i - 1]
-                        p2 = visible_points[i]
-                        t = i / (len(visible_points) - 1) if len(visible_points) > 1 else 0
-                        color = interpolate_color(style["startColor"], style["endColor"], t)
-                        glow_color = color[:3] + (alpha,)
-
-                        draw.line(
-                            [(p1["x"] * scale, p1["y"] * scale), (p2["x"] * scale, p2["y"] * scale)],
-                            fill=glow_color,
-                            width=int(glow_width * scale)
-                        )
-
-            # Draw main tracer line
-            for i in range(1, len(visible_points)):
-                p1 = visible_points[i - 1]
-                p2 = visible_points[i]
-                t = i / (len(visible_points) - 1) if len(visible_points) > 1 else 0
-                color = interpolate_color(style["startColor"], style["endColor"], t)
-                base_width = line_width * (1 - t * 0.3) * scale
-
-                # Core line with slight outer glow
-                outer_color = color[:3] + (150,)
-                draw.line(
-                    [(p1["x"] * scale, p1["y"] * scale), (p2["x"] * scale, p2["y"] * scale)],
-                    fill=outer_color,
-                    width=int(base_width * 1.2)
-                )
-                draw.line(
-                    [(p1["x"] * scale, p1["y"] * scale), (p2["x"] * scale, p2["y"] * scale)],
-                    fill=color,
-                    width=int(base_width)
-                )
-
-                # Joint circle
-                radius = int(base_width * 0.4)
-                draw.ellipse(
-                    [p2["x"] * scale - radius, p2["y"] * scale - radius,
-                     p2["x"] * scale + radius, p2["y"] * scale + radius],
-                    fill=color
-                )
-
-            # Downscale if supersampled
-            if scale > 1:
-                img = img.resize((width, height), Image.LANCZOS)
-
-            # Write raw RGBA bytes directly to FFmpeg pipe
-            proc.stdin.write(img.tobytes())
-
-        # Close stdin and wait for FFmpeg to finish
-        proc.stdin.close()
-        stdout, stderr = proc.communicate()
-
-        frame_gen_elapsed = time.time() - frame_gen_start
-        ffmpeg_elapsed = time.time() - ffmpeg_start
-
-        if proc.returncode != 0:
-            print(f"[RENDER] FFmpeg FAILED")
-            print(f"[RENDER] FFmpeg stderr: {stderr.decode()}")
-            return {"error": stderr.decode()}
+    Each chunk is a ring buffer slot and the views of its frames to write;
+    the slot is returned to free_slots once written. If FFmpeg exits early
+    the rest of the queue is drained unwritten, so the producer never
+    blocks; the failure is reported from FFmpeg's exit code.
+    """
+    broken = False
+    for slot, frames in iter(write_queue.get, None):
+        if not broken:
+            try:
+                for frame in frames:
+                    pipe.write(frame)
+            except BrokenPipeError:
+                broken = True
+        free_slots.put(slot)
+
+
+def _concat_segments(fragment_paths: list, input_path: str, output_path: str):
+    """
+    Stitch rendered fragments back together without re-encoding.
 
-        print(f"[RENDER] Frame generation: {total_frames} frames in {frame_gen_elapsed:.2f}s ({total_frames/frame_gen_elapsed:.1f} fps)")
-        print(f"[RENDER] Frames with tracer: {frames_with_content}/{total_frames}")
-        print(f"[RENDER] FFmpeg total time: {ffmpeg_elapsed:.2f}s")
+    The fragments share encoder settings, so the concat demuxer can copy
+    their video streams; audio is re-muxed from the original input.
+    Returns FFmpeg's error output if stitching failed, otherwise None.
+    """
+    list_path = os.path.join(os.path.dirname(output_path), "segments.txt")
+    with open(list_path, "w") as f:
+        for path in fragment_paths:
+            f.write(f"file '{path}'\n")
 
-        # Read output and return as base64
-        encode_start = time.time()
-        with open(output_path, "rb") as f:
-            output_bytes = f.read()
-        output_base64 = base64.b64encode(output_bytes).decode("utf-8")
+    result = subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_path,
+            "-i", input_path,
+            "-map", "0:v",
+            "-map", "1:a:0?",
+            "-c:v", "copy",
+            "-c:a", "aac",
+            "-b:a", "128k",
+            "-movflags", "+faststart",
+            "-shortest",
+            output_path,
+        ],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        print(f"[RENDER] FFmpeg concat FAILED")
+        print(f"[RENDER] FFmpeg stderr: {result.stderr.decode()}")
+        return result.stderr.decode()
+    return None
+
+
+class TracerOverlay:
+    """
+    Tracer overlay that is drawn incrementally as points become visible.
+
+    The tracer only ever grows, so each pass (glow, outer edge, core line)
+    keeps a persistent single-channel coverage mask and only the segments
+    revealed since the last update are drawn into it, batched into one
+    polyline per run of equal width. All passes share one color field that
+    carries the gradient. The touched region is then recomposited into
+    `frame`, the premultiplied RGBA buffer handed to FFmpeg.
+    """
 
-        output_size_mb = len(output_bytes) / 1024 / 1024
-        total_elapsed = time.time() - total_start
-        print(f"[RENDER] Output: {output_size_mb:.2f} MB, total time: {total_elapsed:.2f}s")
+    def __init__(self, points: list, style: dict, width: int, height: int):
+        line_width = style.get("lineWidth", 4)
+        glow_intensity = style.get("glowIntensity", 10)
+
+        # Sort once so the points visible on any frame are a prefix of the
+        # list, then precompute every segment's colors and widths for the
+        # whole path
+        points = sorted(points, key=lambda p: p["frameIndex"])
+        n = len(points)
+        self.frame_indices = np.fromiter((p["frameIndex"] for p in points), np.float64, n)
+        xs = np.fromiter((p["x"] for p in points), np.float64, n)
+        ys = np.fromiter((p["y"] for p in points), np.float64, n)
+
+        # Vertices, plus the fixed-point form OpenCV takes. LINE_AA is
+        # sub-pixel accurate, so everything is drawn at native resolution.
+        self.positions = np.stack([xs, ys], axis=1)
+        self.vertices = (self.positions * SUBPIXEL_SCALE).round().astype(np.int32)
+        self.vertex_tuples = [tuple(v) for v in self.vertices.tolist()]
+
+        ts = np.linspace(0, 1, n)
+        ramp = color_ramp(style["startColor"], style["endColor"])
+        self.colors = [tuple(c) for c in ramp[(ts * 255).astype(np.intp)].tolist()]
+        base_widths = line_width * (1 - ts * 0.3)
+        self.core_widths = np.maximum(base_widths.astype(np.int32), 1).tolist()
+        self.outer_widths = np.maximum((base_widths * 1.2).astype(np.int32), 1).tolist()
+
+        # How far any pass can reach from a vertex, including the AA fringe
+        # (a path of fewer than two points never draws anything)
+        self.reach = max(self.outer_widths + self.core_widths, default=1) / 2 + 2
+
+        # Glow: the path is drawn into its own mask, which is blurred when
+        # composited
+        self.glow_mask = None
+        if glow_intensity > 0:
+            self.glow_width = max(1, int(line_width + glow_intensity * 0.6))
+            self.glow_sigma = glow_intensity * 0.3
+            self.glow_radius = int(np.ceil(3 * self.glow_sigma)) + 1
+            self.glow_mask = np.zeros((height, width), np.uint8)
+            self.reach = max(self.reach, self.glow_width / 2 + self.glow_radius + 2)
+
+        self.outer_mask = np.zeros((height, width), np.uint8)
+        self.core_mask = np.zeros((height, width), np.uint8)
+
+        # A wide, unblended stroke per segment gives every pixel any pass
+        # can reach the color of the segment next to it
+        self.color_field = np.zeros((height, width, 3), np.uint8)
+        self.color_width = int(np.ceil(2 * self.reach))
+
+        # The color stroke reaches past the masks, and every pixel it
+        # recolors has to be recomposited, or frames would depend on which
+        # earlier frames were composited; LINE_8 rounding can add a pixel
+        self.composite_pad = self.color_width / 2 + 2
+
+        self.width = width
+        self.height = height
+        self.k = 0
+        self.frame = np.zeros((height, width, 4), np.uint8)
+
+    def visible_count(self, source_frame_idx: float) -> int:
+        """Number of points visible on the given source frame."""
+        return int(np.searchsorted(self.frame_indices, source_frame_idx, side="right"))
+
+    def advance(self, k: int) -> bool:
+        """Draw the segments up to point k, returning whether `frame` changed."""
+        if k <= self.k or k < 2:
+            return False
+
+        first = max(1, self.k)
+        self._draw(k)
+        self._composite(first - 1, k)
+        return True
+
+    def catch_up(self, source_frame_idx: int):
+        """
+        Bring the overlay to its state on the given source frame.
+
+        Segments are drawn in the same per-frame batches as when advancing
+        frame by frame, so a pool worker that skips ahead ends up with the
+        exact same masks as one that rendered every frame.
+        """
+        first = max(1, self.k)
+        # Points are revealed on the first whole source frame at or after
+        # their frameIndex; each such frame is one batch
+        reveal_frames = np.unique(np.ceil(self.frame_indices))
+        reveal_frames = reveal_frames[reveal_frames <= source_frame_idx]
+        for k in np.searchsorted(self.frame_indices, reveal_frames, side="right"):
+            if k > self.k and k >= 2:
+                self._draw(int(k))
+        if self.k > first:
+            self._composite(first - 1, self.k)
+
+    def _draw(self, k: int):
+        """Draw the segments from the current point up to point k into the masks."""
+        first = max(1, self.k)
+        vertices = self.vertex_tuples
+        for i in range(first, k):
+            cv2.line(
+                self.color_field, vertices[i - 1], vertices[i], self.colors[i],
+                self.color_width, cv2.LINE_8, SUBPIXEL_SHIFT
+            )
+
+        if self.glow_mask is not None:
+            self._polyline(self.glow_mask, first - 1, k, self.glow_width)
+        for start, stop, width in _width_runs(self.outer_widths, first, k):
+            self._polyline(self.outer_mask, start - 1, stop, width)
+        for start, stop, width in _width_runs(self.core_widths, first, k):
+            self._polyline(self.core_mask, start - 1, stop, width)
+        self.k = k
+
+    def _polyline(self, mask, start: int, stop: int, width: int):
+        """Draw the path through vertices start..stop into a mask in one call."""
+        cv2.polylines(
+            mask, [self.vertices[start:stop]], False, 255,
+            width, cv2.LINE_AA, SUBPIXEL_SHIFT
+        )
+
+    def _composite(self, start: int, stop: int):
+        """Recomposite the region touched by points start..stop into `frame`."""
+        touched = self.positions[start:stop]
+        x0, y0 = np.floor(touched.min(axis=0) - self.composite_pad).astype(int)
+        x1, y1 = np.ceil(touched.max(axis=0) + self.composite_pad).astype(int)
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width), min(y1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        region = (slice(y0, y1), slice(x0, x1))
+        if self.glow_mask is not None:
+            glow, glow_alpha = self._blurred_glow(x0, y0, x1, y1), GLOW_ALPHA
+        else:
+            glow, glow_alpha = self.core_mask[region], 0
+        _composite_kernel()(
+            glow, glow_alpha, self.outer_mask[region], self.core_mask[region],
+            self.color_field[region], self.frame[region]
+        )
+
+    def _blurred_glow(self, x0: int, y0: int, x1: int, y1: int):
+        """Blurred glow mask for a region."""
+        # Blur a window padded by the kernel radius, so the region matches
+        # what blurring the whole mask would give
+        r = self.glow_radius
+        wx0, wy0 = max(x0 - r, 0), max(y0 - r, 0)
+        wx1, wy1 = min(x1 + r, self.width), min(y1 + r, self.height)
+        blurred = cv2.GaussianBlur(
+            self.glow_mask[wy0:wy1, wx0:wx1], (0, 0), self.glow_sigma,
+            borderType=cv2.BORDER_REPLICATE
+        )
+        return blurred[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
 
-        return {
-            "success": True,
-            "video_base64": output_base64
-        }
 
+def _width_runs(widths: list, start: int, stop: int):
+    """Split segments start..stop into runs of equal width as (start, stop, width)."""
+    run_start = start
+    for i in range(start + 1, stop + 1):
+        if i == stop or widths[i] != widths[run_start]:
+            yield run_start, i, widths[run_start]
+            run_start = i
 
+
+def _composite_pixels(glow, glow_alpha, outer, core, color, out):
+    """
+    Composite the glow, outer edge and core masks of a region into `out`.
+
+    Every pass shares the color field, so source-over of the three passes
+    reduces to combining their alphas; each pixel is done in one pass
+    without the temporaries the equivalent NumPy expression allocates.
+    """
+    for y in range(out.shape[0]):
+        for x in range(out.shape[1]):
+            alpha = glow[y, x] * glow_alpha // 255
+            top = outer[y, x] * 150 // 255
+            alpha = top + alpha * (255 - top) // 255
+            top = int(core[y, x])
+            alpha = top + alpha * (255 - top) // 255
+            for c in range(3):
+                out[y, x, c] = color[y, x, c] * alpha // 255
+            out[y, x, 3] = alpha
+
+
+@functools.lru_cache(maxsize=None)
+def _composite_kernel():
+    """
+    _composite_pixels compiled with Numba, on first use.
+
+    Only rendering compiles it, so the endpoints that don't render never
+    import Numba or touch the cache volume. It is compiled eagerly for its
+    one signature, and the render fetches it before forking the pool so
+    the workers inherit the machine code; cache=True lets later containers
+    load it from the cache volume instead of recompiling.
+    """
+    import numba
+
+    return numba.njit(
+        "void(uint8[:, :], int64, uint8[:, :], uint8[:, :], uint8[:, :, :], uint8[:, :, :])",
+        cache=True,
+    )(_composite_pixels)
+
+
+# Per-process state of the overlay worker pool
+_worker_args = None
+_worker_overlay = None
+_worker_ring = None
+_worker_error = None
+
+
+def _init_overlay_worker(ring, *args):
+    """Pool initializer: build this worker's TracerOverlay."""
+    global _worker_args, _worker_overlay, _worker_ring, _worker_error
+    # The pool already runs one worker per core, so OpenCV's own thread
+    # pool would only oversubscribe them
+    cv2.setNumThreads(1)
+    _worker_ring = ring
+    _worker_args = args
+    try:
+        _worker_overlay = TracerOverlay(*args)
+    except Exception as e:
+        # A worker whose initializer raises exits and is replaced by one
+        # that fails the same way, so the tasks would never run; keep the
+        # error and fail each task with it instead
+        _worker_error = e
+
+
+def _render_overlay_chunk(start: int, stop: int, slot: int) -> list:
+    """
+    Render overlay frames start..stop into a slot of the shared ring buffer.
+
+    The worker first brings its overlay up to the state of the frame before
+    `start`, drawing any segments other workers' chunks revealed in between.
+    Only the chunk's first frame and frames that changed are copied into
+    the slot. Returns, for each frame, the index of the slot frame holding
+    its pixels.
+    """
+    global _worker_overlay
+    if _worker_error is not None:
+        raise _worker_error
+    overlay = _worker_overlay
+    k = overlay.visible_count(start - 1) if start > 0 else 0
+    if k < overlay.k:
+        overlay = _worker_overlay = TracerOverlay(*_worker_args)
+    overlay.catch_up(start - 1)
+
+    frames = _worker_ring[slot]
+    sources = []
+    for i, frame_idx in enumerate(range(start, stop)):
+        changed = overlay.advance(overlay.visible_count(frame_idx))
+        if changed or i == 0:
+            frames[i] = overlay.frame
+            sources.append(i)
+        else:
+            sources.append(sources[-1])
+    return sources
+
+
+@functools.lru_cache(maxsize=32)
 def hex_to_rgb(hex_color: str) -> tuple:
     """Convert hex color to RGB tuple."""
     hex_color = hex_color.lstrip("#")
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
 
-def interpolate_color(color1: str, color2: str, t: float) -> tuple:
-    """Interpolate between two hex colors."""
-    r1, g1, b1 = hex_to_rgb(color1)
-    r2, g2, b2 = hex_to_rgb(color2)
-
-    r = int(r1 + (r2 - r1) * t)
-    g = int(g1 + (g2 - g1) * t)
-    b = int(b1 + (b2 - b1) * t)
-
-    return (r, g, b, 255)
+@functools.lru_cache(maxsize=32)
+def color_ramp(color1: str, color2: str):
+    """256-step gradient between two hex colors, as a (256, 3) uint8 array indexed by t * 255."""
+    start = np.array(hex_to_rgb(color1), np.float64)
+    end = np.array(hex_to_rgb(color2), np.float64)
+    rgb = start + (end - start) * (np.arange(256) / 255)[:, None]
+    ramp = np.clip(rgb, 0, 255).astype(np.uint8)
+    # Shared between callers by the cache, so it must not be modified
+    ramp.flags.writeable = False
+    return ramp
 
 
 # Local entrypoint for testing
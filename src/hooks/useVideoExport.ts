@@ -60,26 +60,8 @@ export function useVideoExport(): UseVideoExportReturn {
         throw new Error(`Video file is too large (${Math.round(fileSizeMB)}MB). Please use a shorter clip or lower resolution video (under 100MB).`)
       }
 
-      // Convert video to base64
-      setProgress(0.05)
-      const videoBuffer = await videoFile.arrayBuffer()
-
-      // Convert to base64 in chunks to avoid memory issues
-      const bytes = new Uint8Array(videoBuffer)
-      let videoBase64 = ''
-      const chunkSize = 32768
-      for (let i = 0; i < bytes.length; i += chunkSize) {
-        const chunk = bytes.subarray(i, Math.min(i + chunkSize, bytes.length))
-        videoBase64 += String.fromCharCode.apply(null, Array.from(chunk))
-        // Update progress during encoding
-        setProgress(0.05 + (i / bytes.length) * 0.15)
-      }
-      videoBase64 = btoa(videoBase64)
-      setProgress(0.2)
-
-      // Prepare request payload
-      const payload = {
-        video_base64: videoBase64,
+      // Prepare render parameters; the video itself is uploaded as-is
+      const params = {
         points: points.map(p => ({
           frameIndex: p.frameIndex,
           x: p.x,
@@ -98,15 +80,16 @@ export function useVideoExport(): UseVideoExportReturn {
         }
       }
 
+      const body = new FormData()
+      body.append('params', JSON.stringify(params))
+      body.append('video', videoFile)
+
       setProgress(0.3)
 
-      // Call Modal endpoint
+      // Call Modal endpoint (the browser sets the multipart Content-Type)
       const response = await fetch(MODAL_ENDPOINT, {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(payload),
+        body,
         signal: abortRef.current.signal
       })
 
@@ -124,13 +107,14 @@ export function useVideoExport(): UseVideoExportReturn {
 
       setProgress(0.9)
 
-      // Convert base64 response to blob
-      const outputBytes = atob(result.video_base64)
-      const outputArray = new Uint8Array(outputBytes.length)
-      for (let i = 0; i < outputBytes.length; i++) {
-        outputArray[i] = outputBytes.charCodeAt(i)
+      // Fetch the rendered video from its download URL
+      const outputResponse = await fetch(result.video_url, {
+        signal: abortRef.current.signal
+      })
+      if (!outputResponse.ok) {
+        throw new Error(`Download failed: ${outputResponse.statusText}`)
       }
-      const outputBlob = new Blob([outputArray], { type: 'video/mp4' })
+      const outputBlob = await outputResponse.blob()
 
       // Download the file directly
       // Note: On iOS, this saves to Files app. User can then save to Photos from there.